@@ -1,18 +1,29 @@
 import os
 import re
+import time
+import random
+import asyncio
 import json
 import html
+import hashlib
+import httpx
+import orjson
 import argparse
+import tempfile
+import functools
+from array import array
 from pathlib import Path
 from datetime import datetime
-from openai import OpenAI
+from concurrent.futures import ProcessPoolExecutor
+from openai import AsyncOpenAI, OpenAIError, BadRequestError, RateLimitError, APIConnectionError, APITimeoutError, InternalServerError
 from dotenv import load_dotenv
 from tabulate import tabulate
+from pypdf import PdfWriter
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import letter, A4
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak
+from reportlab.platypus import BaseDocTemplate, PageTemplate, Frame, Table, TableStyle, Paragraph, Spacer, PageBreak
 from reportlab.lib.enums import TA_LEFT, TA_CENTER
 
 # -------------------------
@@ -28,11 +39,20 @@ if not OPENAI_API_KEY:
     print("Please create a .env file with:\n\n  OPENAI_API_KEY=your_key_here")
     exit(1)
 
-client = OpenAI(api_key=OPENAI_API_KEY)
+# One client and connection pool for every request, so TCP/TLS setup is paid once
+client_async = AsyncOpenAI(
+    api_key=OPENAI_API_KEY,
+    http_client=httpx.AsyncClient(
+        limits=httpx.Limits(max_connections=100, max_keepalive_connections=50),
+        http2=True,
+        timeout=60.0
+    )
+)
 
 # -------------------------
 # Load Config (checker.config.json)
 # -------------------------
+@functools.lru_cache(maxsize=1)
 def load_config():
     config_file = Path("checker.config.json")
     if not config_file.exists():
@@ -41,13 +61,21 @@ def load_config():
             "SUPPORTED_EXTENSIONS": [".html", ".twig", ".css", ".scss", ".pcss", ".jsx", ".tsx"],
             "EXCLUDED_DIRS": ["node_modules", "storybook", ".git", "__pycache__", "dist", "build"],
             "EXCLUDED_PATTERNS": [".stories.jsx", ".stories.tsx"],
-            "MODEL": "gpt-4o"
+            "MODEL": "gpt-4o",
+            "MAX_CONCURRENCY": 10,
+            "REQUESTS_PER_MINUTE": 500,
+            "TOKENS_PER_MINUTE": 30000
         }
     with open(config_file, "r", encoding="utf-8") as f:
         return json.load(f)
 
 CONFIG = load_config()
 
+# Derived once for fast lookups while walking the tree; tuples let str.endswith check all at once
+SUPPORTED_EXTENSIONS = tuple(CONFIG["SUPPORTED_EXTENSIONS"])
+EXCLUDED_DIRS = frozenset(CONFIG["EXCLUDED_DIRS"])
+EXCLUDED_PATTERNS = tuple(CONFIG["EXCLUDED_PATTERNS"])
+
 # -------------------------
 # User Inputs (interactive or CLI)
 # -------------------------
@@ -57,12 +85,14 @@ def get_user_inputs():
     parser.add_argument("--version", choices=["2.0", "2.1", "2.2"], help="WCAG version")
     parser.add_argument("--format", choices=["table", "list", "pdf"], default="table", help="Output format")
     parser.add_argument("--dir", default=os.getcwd(), help="Directory to scan")
+    parser.add_argument("--batch", action="store_true", help="Submit all files through the OpenAI Batch API (cheaper, results within 24h)")
+    parser.add_argument("--no-cache", action="store_true", help="Ignore cached results and re-scan every file")
 
     args = parser.parse_args()
 
     # If CLI args provided, use them (CI mode)
     if args.level and args.version:
-        return args.level, args.version, args.format, args.dir
+        return args.level, args.version, args.format, args.dir, args.batch, not args.no_cache
 
     # Otherwise, ask interactively (local mode)
     print("\n👋 Welcome to AI Accessibility Checker\n")
@@ -84,34 +114,190 @@ def get_user_inputs():
     if not path:
         path = os.getcwd()
 
-    return level, version, output_format, path
+    return level, version, output_format, path, args.batch, not args.no_cache
 
 # -------------------------
 # File Finder
 # -------------------------
 def find_supported_files(directory):
-    files_to_scan = []
-    for root, dirs, files in os.walk(directory):
-        dirs[:] = [d for d in dirs if not d.startswith('.') and d not in CONFIG["EXCLUDED_DIRS"]]
-        for file in files:
-            if (
-                any(file.endswith(ext) for ext in CONFIG["SUPPORTED_EXTENSIONS"])
-                and not any(pat in file for pat in CONFIG["EXCLUDED_PATTERNS"])
-            ):
-                files_to_scan.append(os.path.join(root, file))
-    return files_to_scan
+    """
+    Yield the paths of supported files under directory.
+    Uses os.scandir so entry types come from the directory listing without an extra stat per file.
+    """
+    # Locals avoid global/attribute lookups for every entry on large trees
+    supported = SUPPORTED_EXTENSIONS
+    excluded_dirs = EXCLUDED_DIRS
+    excluded_patterns = EXCLUDED_PATTERNS
+    scandir = os.scandir
+    pending = [directory]
+    pop = pending.pop
+    push = pending.append
+
+    while pending:
+        try:
+            entries = scandir(pop())
+        except OSError:
+            continue
+
+        with entries:
+            for entry in entries:
+                name = entry.name
+                if entry.is_dir(follow_symlinks=False):
+                    if not name.startswith('.') and name not in excluded_dirs:
+                        push(entry.path)
+                elif name.endswith(supported) and not any(pat in name for pat in excluded_patterns):
+                    yield entry.path
+
+def number_lines(content):
+    # %-formatting with a local append is the cheapest per-line path for large files
+    numbered = []
+    append = numbered.append
+    for i, line in enumerate(content.splitlines(), 1):
+        append("%4d: %s" % (i, line))
+    return "\n".join(numbered)
+
+def read_numbered_content(file):
+    with open(file, 'r', encoding='utf-8') as f:
+        content = f.read()
+    return number_lines(content)
+
+# -------------------------
+# Response Cache (.ai_checker_cache/)
+# -------------------------
+# Bump when the prompt changes so stale cached answers are not reused
+PROMPT_VERSION = 6
+CACHE_DIR = Path(".ai_checker_cache")
+
+def content_hash(content):
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+def cache_key(file_hash, level, version):
+    return hashlib.sha256(f"{CONFIG['MODEL']}|{level}|{version}|{PROMPT_VERSION}|{file_hash}".encode("utf-8")).hexdigest()
+
+def load_cached_issues(key):
+    try:
+        with open(CACHE_DIR / f"{key}.json", "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+def store_cached_issues(key, issues):
+    try:
+        CACHE_DIR.mkdir(exist_ok=True)
+        with open(CACHE_DIR / f"{key}.json", "w", encoding="utf-8") as f:
+            json.dump(issues, f)
+    except OSError as e:
+        print(f"⚠️ Could not write cache entry: {e}")
+
+# The ledger maps each path to the mtime/size it had when last read and its content hash,
+# so unchanged files can be answered from the cache without being read again
+LEDGER_FILE = Path(".ai_checker_ledger.json")
+
+def load_ledger():
+    try:
+        with open(LEDGER_FILE, "rb") as f:
+            return orjson.loads(f.read())
+    except (OSError, orjson.JSONDecodeError):
+        return {}
+
+def save_ledger(ledger):
+    try:
+        with open(LEDGER_FILE, "wb") as f:
+            f.write(orjson.dumps(ledger))
+    except OSError as e:
+        print(f"⚠️ Could not write scan ledger: {e}")
+
+# -------------------------
+# Rate Limiting & Retries
+# -------------------------
+RETRYABLE_ERRORS = (RateLimitError, APIConnectionError, APITimeoutError, InternalServerError)
+# Enough attempts for the backoff to outlast a per-minute rate-limit window
+MAX_ATTEMPTS = 6
+MAX_BACKOFF = 60
+
+class RateLimiter:
+    """Token bucket shared by all concurrent scans: `rate` units (requests or tokens) per `period` seconds."""
+
+    def __init__(self, rate, period=60.0):
+        self.rate = rate
+        self.period = period
+        self.tokens = rate
+        self.updated = time.monotonic()
+        self.lock = None
+
+    async def acquire(self, amount=1):
+        # A request larger than the whole budget waits for a full bucket rather than forever
+        amount = min(amount, self.rate)
+        # Created lazily so the lock binds to the running event loop
+        if self.lock is None:
+            self.lock = asyncio.Lock()
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate / self.period)
+                self.updated = now
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) * self.period / self.rate)
+
+rate_limiter = RateLimiter(CONFIG.get("REQUESTS_PER_MINUTE", 500))
+token_limiter = RateLimiter(CONFIG.get("TOKENS_PER_MINUTE", 30000))
+
+def retry_after(error):
+    """Seconds the API asked us to wait (Retry-After header), or None."""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    headers = response.headers
+    try:
+        if "retry-after-ms" in headers:
+            return float(headers["retry-after-ms"]) / 1000
+        if "retry-after" in headers:
+            return float(headers["retry-after"])
+    except ValueError:
+        pass
+    return None
+
+# Retries are handled in create_completion, so the client's own retry loop is disabled.
+# with_options shares client_async's connection pool.
+completion_client = client_async.with_options(max_retries=0)
+
+async def create_completion_with_retries(request_body, estimated_tokens):
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        await rate_limiter.acquire()
+        await token_limiter.acquire(estimated_tokens)
+        try:
+            return await completion_client.chat.completions.create(**request_body)
+        except RETRYABLE_ERRORS as e:
+            if attempt == MAX_ATTEMPTS:
+                raise
+            # Honour the server's Retry-After, else jittered exponential backoff capped at MAX_BACKOFF
+            delay = retry_after(e)
+            if delay is None:
+                delay = random.uniform(1, min(MAX_BACKOFF, 2 ** attempt))
+            print(f"⏳ {type(e).__name__}, retrying in {delay:.1f}s (attempt {attempt + 1}/{MAX_ATTEMPTS})...")
+            await asyncio.sleep(delay)
+
+async def create_completion(request_body, estimated_tokens):
+    global response_format
+    try:
+        return await create_completion_with_retries(request_body, estimated_tokens)
+    except BadRequestError as e:
+        # The configured model rejects Structured Outputs; use JSON mode from here on
+        if request_body["response_format"] is JSON_OBJECT_FORMAT or not is_response_format_error(e):
+            raise
+        if response_format is not JSON_OBJECT_FORMAT:
+            print(f"⚠️ {CONFIG['MODEL']} does not support Structured Outputs; falling back to JSON mode.")
+            response_format = JSON_OBJECT_FORMAT
+        request_body = {**request_body, "response_format": JSON_OBJECT_FORMAT}
+        return await create_completion_with_retries(request_body, estimated_tokens)
 
 # -------------------------
 # AI Analysis
 # -------------------------
-def scan_with_ai(content, file_name, level, version):
-    # Detect file type for template-aware analysis
-    file_ext = Path(file_name).suffix.lower()
-    
-    # Template syntax guidance based on file type
-    template_guidance = ""
-    if file_ext in [".twig", ".html"]:
-        template_guidance = """
+# Template syntax guidance based on file type
+TWIG_GUIDANCE = """
 **IMPORTANT - Template Syntax Awareness:**
 This file contains Twig template syntax. Distinguish between these two patterns:
 
@@ -129,8 +315,8 @@ This file contains Twig template syntax. Distinguish between these two patterns:
 
 **Key Rule**: Only flag accessibility issues when the TEMPLATE STRUCTURE itself is building an incomplete HTML element. Do NOT flag when a variable is outputting a complete, pre-rendered HTML element.
 """
-    elif file_ext in [".jsx", ".tsx"]:
-        template_guidance = """
+
+JSX_GUIDANCE = """
 **IMPORTANT - JSX/React Awareness:**
 This file contains JSX/React code. Distinguish between these patterns:
 
@@ -154,116 +340,517 @@ This file contains JSX/React code. Distinguish between these patterns:
 
 **Key Rule**: Only flag when the component/element structure itself lacks accessibility props. Recognize that framework components and render functions handle accessibility internally.
 """
-    
-    prompt = f"""
+
+TEMPLATE_GUIDANCE = {
+    ".twig": TWIG_GUIDANCE,
+    ".html": TWIG_GUIDANCE,
+    ".jsx": JSX_GUIDANCE,
+    ".tsx": JSX_GUIDANCE
+}
+
+def get_template_guidance(file_name):
+    # Detect file type for template-aware analysis
+    return TEMPLATE_GUIDANCE.get(Path(file_name).suffix.lower(), "")
+
+# Files whose content matches none of these patterns have nothing the model could flag,
+# so they are reported clean without an API call. Extensions not listed are always scanned.
+CSS_TRIGGERS = re.compile(
+    r"color\s*:|background|outline|:focus|contrast|font-size|opacity|animation|transition|"
+    r"display\s*:\s*none|visibility|content\s*:|cursor|prefers-",
+    re.IGNORECASE
+)
+JSX_TRIGGERS = re.compile(
+    r"<[a-z]|<\w*(Image|Img|Icon|Button|Link)\b|aria-|role=|on[A-Z]\w*=|tabIndex|alt=|style="
+)
+TRIGGERS = {
+    ".css": CSS_TRIGGERS,
+    ".scss": CSS_TRIGGERS,
+    ".pcss": CSS_TRIGGERS,
+    ".jsx": JSX_TRIGGERS,
+    ".tsx": JSX_TRIGGERS
+}
+
+def needs_ai_scan(file_name, content):
+    triggers = TRIGGERS.get(Path(file_name).suffix.lower())
+    return triggers is None or triggers.search(content) is not None
+
+def estimate_tokens(text):
+    # Rough estimate of OpenAI tokens (~4 characters per token)
+    return len(text) // 4 + 1
+
+# Upper bound on the estimated file tokens packed into one request
+GROUP_MAX_TOKENS = 6000
+# The reply lists every file id with its issues, so the file count is capped too;
+# a reply cut off by the output limit fails every file in the group
+MAX_FILES_PER_GROUP = 20
+
+# Files that would not fit in a request on their own are split into overlapping
+# windows of CHUNK_TOKENS whole lines; smaller files are always sent whole
+CHUNK_THRESHOLD_TOKENS = GROUP_MAX_TOKENS
+CHUNK_TOKENS = 2000
+CHUNK_OVERLAP_TOKENS = 200
+
+def chunk_numbered_content(numbered_content, threshold_tokens=CHUNK_THRESHOLD_TOKENS,
+                           max_tokens=CHUNK_TOKENS, overlap_tokens=CHUNK_OVERLAP_TOKENS):
+    """
+    Split line-numbered content into overlapping chunks if it is above threshold_tokens.
+    Lines keep their original numbers, so issues from every chunk refer to the whole file.
+    Returns a list of tuples (first_line, last_line, chunk_content).
+    """
+    lines = numbered_content.split("\n")
+    if estimate_tokens(numbered_content) <= threshold_tokens:
+        return [(1, len(lines), numbered_content)]
+
+    line_tokens = [estimate_tokens(line) for line in lines]
+    chunks = []
+    start = 0
+    while True:
+        end = start + 1
+        tokens = line_tokens[start]
+        while end < len(lines) and tokens + line_tokens[end] <= max_tokens:
+            tokens += line_tokens[end]
+            end += 1
+        chunks.append((start + 1, end, "\n".join(lines[start:end])))
+        if end >= len(lines):
+            return chunks
+
+        # Start the next chunk a few lines back so issues spanning the boundary are seen whole
+        next_start = end
+        overlap = 0
+        while next_start - 1 > start and overlap + line_tokens[next_start - 1] <= overlap_tokens:
+            next_start -= 1
+            overlap += line_tokens[next_start]
+        start = next_start
+
+def file_label(file_name, line_range):
+    """Name shown in a file separator; chunks add their (first_line, last_line) range."""
+    if line_range is None:
+        return file_name
+    return f"{file_name} (lines {line_range[0]}-{line_range[1]})"
+
+def file_separator(file_id, file_name, line_range):
+    return f"----FILE {file_id}: {file_label(file_name, line_range)}----"
+
+def entry_tokens(entry):
+    """Estimated tokens an entry adds to a request, including its separator line."""
+    file_id, file_name, content, line_range = entry
+    return estimate_tokens(file_separator(file_id, file_name, line_range)) + estimate_tokens(content)
+
+def file_names(files):
+    return ", ".join(entry[1] for entry in files)
+
+def merge_chunk_issues(chunk_results):
+    """Combine issues from overlapping chunks, dropping duplicates reported by both."""
+    merged = {}
+    for issues in chunk_results:
+        for issue in issues:
+            line_numbers = issue.get("line_numbers", [])
+            if not isinstance(line_numbers, list):
+                line_numbers = [line_numbers]
+            merged.setdefault((issue.get("title"), tuple(line_numbers)), issue)
+    return list(merged.values())
+
+class PromptPacker:
+    """
+    Greedily packs small files into shared requests so the prompt is sent once per group.
+    A group holds at most max_tokens (separators included) and max_files entries.
+    Files are only grouped with others that use the same template guidance, and two
+    chunks of the same file never share a group (their overlap would be sent twice).
+    """
+
+    def __init__(self, max_tokens=GROUP_MAX_TOKENS, max_files=MAX_FILES_PER_GROUP):
+        self.max_tokens = max_tokens
+        self.max_files = max_files
+        self.open_groups = {}
+
+    def add(self, entry):
+        """Add a (file_id, file_name, content, line_range) entry; returns a full group ready to send, or None."""
+        guidance = get_template_guidance(entry[1])
+        tokens = entry_tokens(entry)
+        full_group = None
+        current = self.open_groups.get(guidance)
+        # A file's chunks are added back to back, so only the last entry can be a sibling
+        sibling_chunk = (
+            current and entry[3] is not None and current[0][-1][3] is not None and
+            current[0][-1][0].partition(".")[0] == entry[0].partition(".")[0]
+        )
+        if current and (current[1] + tokens > self.max_tokens or len(current[0]) >= self.max_files or sibling_chunk):
+            full_group = current[0]
+            current = None
+        if current is None:
+            current = self.open_groups[guidance] = [[], 0]
+        current[0].append(entry)
+        current[1] += tokens
+        return full_group
+
+    def flush(self):
+        """Return the remaining partially filled groups."""
+        groups = [group for group, _ in self.open_groups.values()]
+        self.open_groups = {}
+        return groups
+
+def batch_files_for_prompt(files, max_tokens=GROUP_MAX_TOKENS, max_files=MAX_FILES_PER_GROUP):
+    """
+    files: list of tuples (file_id, file_name, content, line_range)
+    Returns a list of groups, each a list of (file_id, file_name, content, line_range).
+    """
+    packer = PromptPacker(max_tokens, max_files)
+    groups = [group for group in map(packer.add, files) if group]
+    return groups + packer.flush()
+
+# The system prompt never changes between requests and comes first, followed by the
+# guidance variant and then the user message. OpenAI's prompt caching only applies
+# once this shared prefix reaches 1024 tokens; today it is roughly 300-800 tokens,
+# so the ordering only pays off if the rules or guidance grow past that
+SYSTEM_PROMPT = """You are an expert accessibility auditor.
 You are an expert in web accessibility and WCAG compliance.
 
-The following code includes line numbers.
-{template_guidance}
-
-Scan the code and return **only valid JSON** with this structure:
-[
-  {{
-    "title": "Short title of the issue",
-    "issue_type": "Type/category of the issue (e.g., Contrast, Alt Text, Keyboard Navigation)",
-    "description": "Detailed description of the issue",
-    "line_numbers": [list of affected lines],
-    "code_snippet": "Relevant code snippet",
-    "suggestion": "AI-based suggestion to fix it",
-    "severity": "High | Medium | Low"
-  }}
-]
+The code you receive includes line numbers.
+Each file starts with a "----FILE <id>: <name>----" separator.
+Scan every file and return a JSON object with key "files": one entry per file with its "id" and its "issues".
+For each issue provide:
+- title: Short title of the issue
+- issue_type: Type/category of the issue (e.g., Contrast, Alt Text, Keyboard Navigation)
+- description: Detailed description of the issue
+- line_numbers: List of affected lines
+- code_snippet: Relevant code snippet
+- suggestion: AI-based suggestion to fix it
+- severity: High | Medium | Low
 
 Rules:
-- Do not include any extra text outside JSON.
+- Include every file id; use an empty "issues" list for files with no issues.
+- Line numbers refer to the numbered lines of that file.
 - Severity should be based on WCAG impact.
-- If no issues found, return [].
 - For template files: Recognize that variables/expressions provide dynamic content at runtime.
 - Only flag issues when the template structure itself is inaccessible, not when dynamic content might fix it.
+"""
 
-WCAG Version: {version}
+USER_PROMPT_TEMPLATE = """WCAG Version: {version}
 Accessibility Level: {level}
 
-File: {file_name}
-----------------------
-{content}
+{files_block}
 """
 
-    try:
-        response = client.chat.completions.create(
-            model=CONFIG["MODEL"],
-            messages=[
-                {"role": "system", "content": "You are an expert accessibility auditor."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.3
-        )
+ISSUE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "title": {"type": "string"},
+        "issue_type": {"type": "string"},
+        "description": {"type": "string"},
+        "line_numbers": {"type": "array", "items": {"type": "integer"}},
+        "code_snippet": {"type": "string"},
+        "suggestion": {"type": "string"},
+        "severity": {"type": "string", "enum": ["High", "Medium", "Low"]}
+    },
+    "required": ["title", "issue_type", "description", "line_numbers", "code_snippet", "suggestion", "severity"],
+    "additionalProperties": False
+}
 
-        raw_output = response.choices[0].message.content.strip()
-        raw_output = re.sub(r"^```(json)?|```$", "", raw_output, flags=re.MULTILINE).strip()
+# Structured Outputs: the reply is guaranteed to be JSON matching this schema
+RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "accessibility_issues",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {
+                "files": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "id": {"type": "string"},
+                            "issues": {"type": "array", "items": ISSUE_SCHEMA}
+                        },
+                        "required": ["id", "issues"],
+                        "additionalProperties": False
+                    }
+                }
+            },
+            "required": ["files"],
+            "additionalProperties": False
+        }
+    }
+}
 
-        match = re.search(r"\[.*\]", raw_output, re.DOTALL)
-        if match:
-            return json.loads(match.group(0))
-        else:
-            return []
+# Plain JSON mode for models without Structured Outputs: the system prompt still describes
+# the expected shape, and replies are validated before use
+JSON_OBJECT_FORMAT = {"type": "json_object"}
+response_format = RESPONSE_FORMAT
+
+def is_response_format_error(error):
+    return getattr(error, "param", None) == "response_format" or "response_format" in str(error)
+
+def build_messages(files, level, version):
+    messages = [{"role": "system", "content": SYSTEM_PROMPT}]
+
+    template_guidance = get_template_guidance(files[0][1])
+    if template_guidance:
+        messages.append({"role": "system", "content": template_guidance})
+
+    files_block = "\n".join(
+        f"{file_separator(file_id, file_name, line_range)}\n{content}"
+        for file_id, file_name, content, line_range in files
+    )
+    messages.append({
+        "role": "user",
+        "content": USER_PROMPT_TEMPLATE.format(version=version, level=level, files_block=files_block)
+    })
+    return messages
+
+def build_request_body(files, level, version):
+    return {
+        "model": CONFIG["MODEL"],
+        "messages": build_messages(files, level, version),
+        "temperature": 0.3,
+        "response_format": response_format
+    }
+
+def request_tokens(request_body):
+    """Estimated prompt tokens of a request, charged against TOKENS_PER_MINUTE."""
+    return sum(estimate_tokens(message["content"]) for message in request_body["messages"])
+
+def parse_issues(raw_output):
+    """Parse the structured model reply into a dict of file_id -> issues_list."""
+    return {str(entry["id"]): entry["issues"] for entry in orjson.loads(raw_output)["files"]}
 
-    except json.JSONDecodeError as e:
-        print(f"⚠️ JSON parsing error: {e}")
-        return []
-    except Exception as e:
-        print(f"❌ Error scanning file {file_name}: {str(e)}")
-        return []
+def valid_issues(issues):
+    """Return issues if it is a list of issue objects, otherwise None (treated as a failed scan)."""
+    if isinstance(issues, list) and all(
+        isinstance(issue, dict) and isinstance(issue.get("line_numbers", []), list) for issue in issues
+    ):
+        return issues
+    return None
+
+async def scan_with_ai(files, level, version):
+    """
+    Scan a group of files in a single request.
+    Returns a dict of file_id -> issues_list; files that failed are missing.
+    """
+    try:
+        request_body = build_request_body(files, level, version)
+        response = await create_completion(request_body, request_tokens(request_body))
+    except OpenAIError as e:
+        print(f"❌ Error scanning file {file_names(files)}: {str(e)}")
+        return {}
+
+    message = response.choices[0].message
+    if getattr(message, "refusal", None):
+        print(f"⚠️ Model refused to scan {file_names(files)}: {message.refusal}")
+        return {}
+
+    try:
+        return parse_issues(message.content or "")
+    except (orjson.JSONDecodeError, KeyError, TypeError) as e:
+        # A cut-off reply, or in JSON mode a reply of the wrong shape
+        print(f"⚠️ JSON parsing error: {e!r}")
+        return {}
 
 # -------------------------
-# PDF Export
+# Batch API (non-interactive runs)
 # -------------------------
-def export_to_pdf(all_results, level, version, directory):
+BATCH_TERMINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+async def scan_with_ai_batch(groups, level, version):
     """
-    Generate a PDF report from accessibility scan results.
-    all_results: list of tuples (file_path, issues_list)
+    Submit every file group as one request of an OpenAI batch job and wait for it.
+    Returns a dict of file_id -> issues_list like scan_with_ai. Results a batch finished
+    before it expired or was cancelled are kept; the other files are missing (failed).
     """
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    pdf_filename = f"accessibility_report_{timestamp}.pdf"
+    if not groups:
+        return {}
+
+    lines = [
+        json.dumps({
+            "custom_id": f"group-{index}",
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": build_request_body(files, level, version)
+        })
+        for index, files in enumerate(groups)
+    ]
+
+    batch_input_file = await client_async.files.create(
+        file=("batch.jsonl", "\n".join(lines).encode("utf-8")),
+        purpose="batch"
+    )
+    batch = await client_async.batches.create(
+        input_file_id=batch_input_file.id,
+        endpoint="/v1/chat/completions",
+        completion_window="24h"
+    )
+    print(f"📦 Submitted batch {batch.id} with {len(lines)} request(s). Waiting for results...")
+
+    # Poll with exponential backoff until the batch reaches a terminal state
+    delay = 5
+    while batch.status not in BATCH_TERMINAL_STATUSES:
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, 300)
+        batch = await client_async.batches.retrieve(batch.id)
+        print(f"⏳ Batch {batch.id}: {batch.status}")
+
+    # Successful requests land in the output file and failed ones in the error file
+    issues_by_id = {}
+    for result_file_id in (batch.output_file_id, batch.error_file_id):
+        if not result_file_id:
+            continue
+        output = await client_async.files.content(result_file_id)
+        for line in output.text.splitlines():
+            if not line.strip():
+                continue
+            try:
+                result = orjson.loads(line)
+                files = groups[int(result["custom_id"].split("-", 1)[1])]
+                response = result.get("response") or {}
+                if response.get("status_code") != 200:
+                    print(f"❌ Error scanning file {file_names(files)}: {result.get('error') or response.get('body')}")
+                    continue
+                issues_by_id.update(parse_issues(response["body"]["choices"][0]["message"]["content"]))
+            except Exception as e:
+                # One malformed result line fails only its own group; the rest of the batch is kept
+                print(f"⚠️ Could not read batch result: {e}")
+
+    # A batch that did not complete leaves files unscanned; they are reported as failed
+    if batch.status != "completed":
+        print(f"❌ Batch {batch.id} ended with status '{batch.status}'.")
+        for error in getattr(batch.errors, "data", None) or []:
+            print(f"   {error.code}: {error.message}")
+
+    return issues_by_id
+
+# -------------------------
+# PDF Export
+# -------------------------
+# Below this many files a single process is faster than starting PDF workers
+PDF_SHARD_MIN_FILES = 200
+
+# Styles are created once and shared by every report (and rebuilt cheaply in workers)
+PDF_STYLES = getSampleStyleSheet()
+
+TITLE_STYLE = ParagraphStyle(
+    'CustomTitle',
+    parent=PDF_STYLES['Heading1'],
+    fontSize=24,
+    textColor=colors.HexColor('#1a1a1a'),
+    spaceAfter=12,
+    alignment=TA_CENTER
+)
+
+HEADING_STYLE = ParagraphStyle(
+    'CustomHeading',
+    parent=PDF_STYLES['Heading2'],
+    fontSize=14,
+    textColor=colors.HexColor('#2c5aa0'),
+    spaceAfter=10,
+    spaceBefore=10
+)
+
+FILE_HEADING_STYLE = ParagraphStyle(
+    'FileHeading',
+    parent=PDF_STYLES['Heading2'],
+    fontSize=12,
+    textColor=colors.HexColor('#d9534f'),
+    spaceAfter=8,
+    spaceBefore=12
+)
+
+NO_ISSUE_STYLE = ParagraphStyle(
+    'NoIssue',
+    parent=PDF_STYLES['Normal'],
+    fontSize=10,
+    textColor=colors.HexColor('#28a745'),
+    spaceAfter=8
+)
+
+FAILED_STYLE = ParagraphStyle(
+    'Failed',
+    parent=PDF_STYLES['Normal'],
+    fontSize=10,
+    textColor=colors.HexColor('#d9534f'),
+    spaceAfter=8
+)
+
+META_TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#f0f0f0')),
+    ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
+    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+    ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+    ('FONTNAME', (1, 0), (1, -1), 'Helvetica'),
+    ('FONTSIZE', (0, 0), (-1, -1), 10),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+    ('GRID', (0, 0), (-1, -1), 0.5, colors.grey)
+])
+
+ISSUE_TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#2c5aa0')),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 9),
+    ('FONTSIZE', (0, 1), (-1, -1), 8),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
+    ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+    ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+    ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+    ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f9f9f9')])
+])
+
+def pdf_file_section(file_path, issues):
+    """Yield the flowables for one file's section of the report."""
+    normal = PDF_STYLES['Normal']
+
+    yield Paragraph(f"File: {os.path.basename(file_path)}", FILE_HEADING_STYLE)
+    yield Paragraph(f"<font size=8 color='#666666'>{file_path}</font>", normal)
+    yield Spacer(1, 0.1*inch)
     
-    doc = SimpleDocTemplate(pdf_filename, pagesize=letter,
-                           rightMargin=0.5*inch, leftMargin=0.5*inch,
-                           topMargin=0.5*inch, bottomMargin=0.5*inch)
+    if issues is None:
+        # The scan failed, so the file must not read as clean
+        yield Paragraph("❌ Scan failed: this file was not checked. Re-run to retry it.", FAILED_STYLE)
+        yield Spacer(1, 0.2*inch)
+        return
     
-    story = []
-    styles = getSampleStyleSheet()
+    if not issues:
+        # Display "No issues found" message
+        yield Paragraph("✅ No accessibility issues found.", NO_ISSUE_STYLE)
+        yield Spacer(1, 0.2*inch)
+        return
     
-    # Custom styles
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=24,
-        textColor=colors.HexColor('#1a1a1a'),
-        spaceAfter=12,
-        alignment=TA_CENTER
-    )
+    # Create table for issues
+    table_data = [["#", "Title", "Type", "Severity", "Lines", "Description", "Suggestion"]]
     
-    heading_style = ParagraphStyle(
-        'CustomHeading',
-        parent=styles['Heading2'],
-        fontSize=14,
-        textColor=colors.HexColor('#2c5aa0'),
-        spaceAfter=10,
-        spaceBefore=10
-    )
+    for idx, issue in enumerate(issues, 1):
+        severity = issue.get('severity', 'N/A')
+        
+        # Color code severity
+        if severity == 'High':
+            severity_color = '<font color="red"><b>High</b></font>'
+        elif severity == 'Medium':
+            severity_color = '<font color="orange"><b>Medium</b></font>'
+        else:
+            severity_color = '<font color="green">Low</font>'
+        
+        table_data.append([
+            str(idx),
+            Paragraph(html.escape(issue.get('title', 'N/A')), normal),
+            Paragraph(html.escape(issue.get('issue_type', 'N/A')), normal),
+            Paragraph(severity_color, normal),
+            Paragraph(', '.join(map(str, issue.get('line_numbers', []))), normal),
+            Paragraph(html.escape(issue.get('description', 'N/A')), normal),
+            Paragraph(html.escape(issue.get('suggestion', 'N/A')), normal)
+        ])
     
-    file_heading_style = ParagraphStyle(
-        'FileHeading',
-        parent=styles['Heading2'],
-        fontSize=12,
-        textColor=colors.HexColor('#d9534f'),
-        spaceAfter=8,
-        spaceBefore=12
-    )
+    issue_table = Table(table_data, colWidths=[0.3*inch, 1.1*inch, 0.85*inch, 0.7*inch, 0.8*inch, 1.7*inch, 1.7*inch])
+    issue_table.setStyle(ISSUE_TABLE_STYLE)
     
+    yield issue_table
+    yield Spacer(1, 0.3*inch)
+
+def pdf_report_header(level, version, directory, summary):
+    """Yield the title, metadata table and summary that open the report."""
     # Title
-    story.append(Paragraph("Accessibility Analysis Report", title_style))
-    story.append(Spacer(1, 0.2*inch))
+    yield Paragraph("Accessibility Analysis Report", TITLE_STYLE)
+    yield Spacer(1, 0.2*inch)
     
     # Metadata
     metadata = [
@@ -274,97 +861,413 @@ def export_to_pdf(all_results, level, version, directory):
     ]
     
     meta_table = Table(metadata, colWidths=[2*inch, 4*inch])
-    meta_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#f0f0f0')),
-        ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-        ('FONTNAME', (1, 0), (1, -1), 'Helvetica'),
-        ('FONTSIZE', (0, 0), (-1, -1), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey)
-    ]))
+    meta_table.setStyle(META_TABLE_STYLE)
     
-    story.append(meta_table)
-    story.append(Spacer(1, 0.3*inch))
+    yield meta_table
+    yield Spacer(1, 0.3*inch)
     
     # Summary
-    total_files = len(all_results)
-    total_issues = sum(len(issues) for _, issues in all_results)
-    files_with_issues = sum(1 for _, issues in all_results if issues)
+    total_issues, files_with_issues, total_files, failed_files = summary
+    yield Paragraph(f"Summary: {total_issues} issue(s) found across {files_with_issues} of {total_files} file(s)", HEADING_STYLE)
+    if failed_files:
+        yield Paragraph(f"❌ {failed_files} file(s) could not be scanned; they are listed as failed, not clean.", FAILED_STYLE)
+    yield Spacer(1, 0.2*inch)
+
+def read_results(results_path, start=0, stop=None):
+    """
+    Yield (file_path, issues_list) tuples from an NDJSON results file; issues is None for failed scans.
+    start/stop are byte offsets, so a shard seeks to its lines instead of decoding the earlier ones.
+    """
+    with open(results_path, "rb") as f:
+        f.seek(start)
+        offset = start
+        for line in f:
+            if stop is not None and offset >= stop:
+                return
+            offset += len(line)
+            if line.strip():
+                result = orjson.loads(line)
+                yield result["path"], result["issues"]
+
+def build_pdf(pdf_filename, results, header=None):
+    """
+    Lay out one PDF file from an iterable of (file_path, issues_list) tuples.
+    header: (level, version, directory, summary) when this file starts the report.
+    Module-level so it can run in a worker process.
+    """
+    doc = BaseDocTemplate(pdf_filename, pagesize=letter,
+                          rightMargin=0.5*inch, leftMargin=0.5*inch,
+                          topMargin=0.5*inch, bottomMargin=0.5*inch)
+    frame = Frame(doc.leftMargin, doc.bottomMargin, doc.width, doc.height, id='normal')
+    doc.addPageTemplates([PageTemplate(id='report', frames=[frame])])
     
-    story.append(Paragraph(f"Summary: {total_issues} issue(s) found across {files_with_issues} of {total_files} file(s)", heading_style))
-    story.append(Spacer(1, 0.2*inch))
+    story = []
+    if header:
+        story.extend(pdf_report_header(*header))
     
     # Issues by file
-    for file_path, issues in all_results:
-        story.append(Paragraph(f"File: {os.path.basename(file_path)}", file_heading_style))
-        story.append(Paragraph(f"<font size=8 color='#666666'>{file_path}</font>", styles['Normal']))
-        story.append(Spacer(1, 0.1*inch))
-        
-        if not issues:
-            # Display "No issues found" message
-            no_issue_style = ParagraphStyle(
-                'NoIssue',
-                parent=styles['Normal'],
-                fontSize=10,
-                textColor=colors.HexColor('#28a745'),
-                spaceAfter=8
-            )
-            story.append(Paragraph("✅ No accessibility issues found.", no_issue_style))
-            story.append(Spacer(1, 0.2*inch))
-            continue
-        
-        # Create table for issues
-        table_data = [["#", "Title", "Type", "Severity", "Lines", "Description", "Suggestion"]]
-        
-        for idx, issue in enumerate(issues, 1):
-            severity = issue.get('severity', 'N/A')
-            
-            # Color code severity
-            if severity == 'High':
-                severity_color = '<font color="red"><b>High</b></font>'
-            elif severity == 'Medium':
-                severity_color = '<font color="orange"><b>Medium</b></font>'
-            else:
-                severity_color = '<font color="green">Low</font>'
-            
-            table_data.append([
-                str(idx),
-                Paragraph(html.escape(issue.get('title', 'N/A')), styles['Normal']),
-                Paragraph(html.escape(issue.get('issue_type', 'N/A')), styles['Normal']),
-                Paragraph(severity_color, styles['Normal']),
-                Paragraph(', '.join(map(str, issue.get('line_numbers', []))), styles['Normal']),
-                Paragraph(html.escape(issue.get('description', 'N/A')), styles['Normal']),
-                Paragraph(html.escape(issue.get('suggestion', 'N/A')), styles['Normal'])
-            ])
-        
-        issue_table = Table(table_data, colWidths=[0.3*inch, 1.1*inch, 0.85*inch, 0.7*inch, 0.8*inch, 1.7*inch, 1.7*inch])
-        issue_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#2c5aa0')),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 9),
-            ('FONTSIZE', (0, 1), (-1, -1), 8),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-            ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f9f9f9')])
-        ]))
-        
-        story.append(issue_table)
-        story.append(Spacer(1, 0.3*inch))
+    story.extend(
+        flowable
+        for file_path, issues in results
+        for flowable in pdf_file_section(file_path, issues)
+    )
     
     # Build PDF
     doc.build(story)
     return pdf_filename
 
+def build_pdf_shard(pdf_filename, results_path, start, stop, header=None):
+    """Worker entry point: lay out the results between byte offsets [start, stop) of the NDJSON file."""
+    return build_pdf(pdf_filename, read_results(results_path, start, stop), header)
+
+def export_to_pdf(results_path, level, version, directory):
+    """
+    Generate a PDF report from accessibility scan results.
+    results_path: NDJSON file with one {"path", "issues"} object per scanned file (issues null if it failed)
+    Large reports are laid out in parallel shards and merged into one file.
+    """
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    pdf_filename = f"accessibility_report_{timestamp}.pdf"
+    
+    # A counting pass, so the summary can open the report without keeping every result in memory.
+    # It also records where each result starts, so shards can seek straight to their slice
+    total_issues = files_with_issues = failed_files = 0
+    offsets = array("q")
+    offset = 0
+    with open(results_path, "rb") as f:
+        for line in f:
+            if line.strip():
+                offsets.append(offset)
+                issues = orjson.loads(line)["issues"]
+                if issues is None:
+                    failed_files += 1
+                else:
+                    total_issues += len(issues)
+                    files_with_issues += bool(issues)
+            offset += len(line)
+    total_files = len(offsets)
+    header = (level, version, directory, (total_issues, files_with_issues, total_files, failed_files))
+    
+    # Count only the CPUs this process may run on (containers often report the host's)
+    cpus = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+    shard_count = min(cpus, total_files // PDF_SHARD_MIN_FILES)
+    if shard_count <= 1:
+        return build_pdf(pdf_filename, read_results(results_path), header)
+    
+    # Contiguous slices keep files in report order; each shard starts on a new page
+    shard_size = -(-total_files // shard_count)
+    with tempfile.TemporaryDirectory() as shard_dir:
+        shard_paths = [os.path.join(shard_dir, f"shard_{i}.pdf") for i in range(shard_count)]
+        bounds = [offsets[i*shard_size] for i in range(shard_count)] + [None]
+        with ProcessPoolExecutor(max_workers=shard_count) as executor:
+            futures = [
+                executor.submit(build_pdf_shard, shard_path, results_path, bounds[i], bounds[i+1], header if i == 0 else None)
+                for i, shard_path in enumerate(shard_paths)
+            ]
+            for future in futures:
+                future.result()
+        
+        writer = PdfWriter()
+        for shard_path in shard_paths:
+            writer.append(shard_path)
+        with open(pdf_filename, "wb") as f:
+            writer.write(f)
+    
+    return pdf_filename
+
+# -------------------------
+# Console Output
+# -------------------------
+def print_issues(issues, output_format):
+    if not issues:
+        print("✅ No accessibility issues found.\n")
+        return
+
+    if output_format == "table":
+        table_data = [
+            [
+                i+1,
+                issue.get("title", ""),
+                issue.get("issue_type", ""),
+                issue.get("severity", ""),
+                ", ".join(map(str, issue.get("line_numbers", []))),
+                issue.get("description", ""),
+                issue.get("suggestion", "")
+            ]
+            for i, issue in enumerate(issues)
+        ]
+        headers = ["#", "Issue Title", "Issue Type", "Severity", "Line(s)", "Description", "Suggestion"]
+        print(tabulate(table_data, headers=headers, tablefmt="grid", maxcolwidths=[None, 25, 15, 10, 10, 40, 40]))
+        print("\n" + "-"*100 + "\n")
+
+    elif output_format == "list":
+        for idx, issue in enumerate(issues, start=1):
+            print(f"\n{idx}. {issue.get('title', '')} [{issue.get('issue_type', '')}] (Severity: {issue.get('severity', '')})")
+            print(f"   Lines: {', '.join(map(str, issue.get('line_numbers', [])))}")
+            print(f"   Description: {issue.get('description', '')}")
+            print(f"   Suggestion: {issue.get('suggestion', '')}")
+            print("-"*80)
+
+# -------------------------
+# Scan Session
+# -------------------------
+# Finished results kept in memory to answer later identical copies without a new request;
+# older ones are dropped so memory stays flat on large trees
+RECENT_RESULTS = 1000
+
+class ScanSession:
+    """
+    State for one run: the files found, what has been scanned so far, and where results go.
+    Entries are (file_id, file_name, content, line_range) tuples; line_range is None for whole
+    files and (first_line, last_line) for chunks, whose ids look like "<file_id>.<n>".
+    """
+
+    def __init__(self, level, version, output_format, directory, use_batch, use_cache):
+        self.level = level
+        self.version = version
+        self.output_format = output_format
+        self.directory = directory
+        self.use_batch = use_batch
+        self.use_cache = use_cache
+        self.max_concurrency = CONFIG.get("MAX_CONCURRENCY", 10)
+        # Limit how many requests are in flight (or waiting to start) at once; readers wait on it,
+        # so reading slows down to the pace of the API
+        self.semaphore = asyncio.Semaphore(self.max_concurrency)
+        self.packer = PromptPacker()
+        self.ledger = load_ledger() if use_cache else {}
+
+        self.file_paths = {}
+        self.cache_keys = {}
+        # Files with identical content are scanned once. While a scan is pending, ids_by_hash
+        # lists every copy and hash_by_id maps the scanned id to its hash; issues_by_hash holds
+        # the last RECENT_RESULTS finished results
+        self.ids_by_hash = {}
+        self.hash_by_id = {}
+        self.issues_by_hash = {}
+        # Oversized files are scanned in chunks; chunk_ids lists each pending file's chunk ids
+        self.chunk_ids = {}
+        self.chunk_results = {}
+        self.groups = []
+        # Only unfinished scan tasks are kept
+        self.scan_tasks = set()
+        # Files whose scan failed; they are reported as failed, never as clean
+        self.failed = 0
+
+        # Results are written out as each file finishes, so memory does not grow with the
+        # report and partial results survive an interrupted run
+        self.results_file = None
+        self.results_path = None
+        if output_format == "pdf":
+            self.results_path = f"accessibility_results_{datetime.now().strftime('%Y%m%d_%H%M%S')}.ndjson"
+            self.results_file = open(self.results_path, "wb")
+
+    def close(self):
+        if self.results_file:
+            self.results_file.close()
+        if self.use_cache:
+            save_ledger(self.ledger)
+
+    # --- Results ---
+
+    def report(self, file_id, issues):
+        # issues is None when the scan failed
+        file = self.file_paths[file_id]
+        if issues is None:
+            self.failed += 1
+        if self.results_file:
+            self.results_file.write(orjson.dumps({"path": file, "issues": issues}) + b"\n")
+            self.results_file.flush()
+        else:
+            print(f"\n📄 Results: {file}")
+            if issues is None:
+                print("❌ Scan failed: this file was not checked. Re-run to retry it.\n")
+            else:
+                print_issues(issues, self.output_format)
+
+    def finish_hash(self, file_hash, issues):
+        # Report the scanned file and every identical copy found so far
+        self.issues_by_hash[file_hash] = issues
+        if len(self.issues_by_hash) > RECENT_RESULTS:
+            del self.issues_by_hash[next(iter(self.issues_by_hash))]
+        for file_id in self.ids_by_hash.pop(file_hash):
+            self.report(file_id, issues)
+
+    def finish_file(self, file_id, issues):
+        # issues is None when the scan failed; it is reported as failed and retried next run
+        key = self.cache_keys.pop(file_id, None)
+        if issues is not None and key:
+            store_cached_issues(key, issues)
+        self.finish_hash(self.hash_by_id.pop(file_id), issues)
+
+    def handle_entry(self, entry_id, issues):
+        file_id, _, chunk = entry_id.partition(".")
+        if not chunk:
+            self.finish_file(file_id, issues)
+            return
+
+        # Reassemble chunked files; if any chunk failed, the whole file is reported as failed
+        parts = self.chunk_results.setdefault(file_id, {})
+        parts[entry_id] = issues
+        if len(parts) == len(self.chunk_ids[file_id]):
+            del self.chunk_results[file_id]
+            results = [parts[chunk_id] for chunk_id in self.chunk_ids.pop(file_id)]
+            self.finish_file(file_id, None if None in results else merge_chunk_issues(results))
+
+    def handle_scanned(self, files, scanned):
+        for entry_id, *_ in files:
+            # A malformed result is treated as a failed scan, before anything is reported
+            self.handle_entry(entry_id, valid_issues(scanned.get(entry_id)))
+
+    # --- Reading ---
+
+    def reuse_unchanged(self, file_id, file, entry):
+        # Answer from earlier results without reading the file; False if it must be read
+        file_hash = entry["hash"]
+        if file_hash is None:
+            print(f"⏭️ Skipping (nothing to check): {file}")
+            self.report(file_id, [])
+            return True
+        if file_hash in self.issues_by_hash:
+            self.report(file_id, self.issues_by_hash[file_hash])
+            return True
+        if file_hash in self.ids_by_hash:
+            return False
+        cached = load_cached_issues(cache_key(file_hash, self.level, self.version))
+        if cached is None:
+            return False
+        print(f"♻️ Using cached result: {file}")
+        self.ids_by_hash[file_hash] = [file_id]
+        self.finish_hash(file_hash, cached)
+        return True
+
+    async def read_file(self, file_id, file):
+        stat = None
+        if self.use_cache:
+            try:
+                stat = os.stat(file)
+            except OSError:
+                stat = None
+            if stat:
+                entry = self.ledger.get(file)
+                if entry and entry["mtime_ns"] == stat.st_mtime_ns and entry["size"] == stat.st_size:
+                    if self.reuse_unchanged(file_id, file, entry):
+                        return
+
+        try:
+            numbered_content = await asyncio.to_thread(read_numbered_content, file)
+        except Exception as e:
+            print(f"❗ Could not read {file}: {str(e)}")
+            del self.file_paths[file_id]
+            return
+
+        file_name = os.path.basename(file)
+        if not needs_ai_scan(file_name, numbered_content):
+            print(f"⏭️ Skipping (nothing to check): {file}")
+            if stat:
+                self.ledger[file] = {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size, "hash": None}
+            self.report(file_id, [])
+            return
+
+        file_hash = content_hash(numbered_content)
+        if stat:
+            self.ledger[file] = {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size, "hash": file_hash}
+        if file_hash in self.issues_by_hash:
+            self.report(file_id, self.issues_by_hash[file_hash])
+            return
+        if file_hash in self.ids_by_hash:
+            self.ids_by_hash[file_hash].append(file_id)
+            return
+        self.ids_by_hash[file_hash] = [file_id]
+
+        if self.use_cache:
+            key = cache_key(file_hash, self.level, self.version)
+            cached = load_cached_issues(key)
+            if cached is not None:
+                print(f"♻️ Using cached result: {file}")
+                self.finish_hash(file_hash, cached)
+                return
+            self.cache_keys[file_id] = key
+        self.hash_by_id[file_id] = file_hash
+
+        chunks = chunk_numbered_content(numbered_content)
+        if len(chunks) == 1:
+            entries = [(file_id, file_name, numbered_content, None)]
+        else:
+            entries = [
+                (f"{file_id}.{index}", file_name, chunk, (first_line, last_line))
+                for index, (first_line, last_line, chunk) in enumerate(chunks, 1)
+            ]
+            self.chunk_ids[file_id] = [entry[0] for entry in entries]
+
+        for entry in entries:
+            group = self.packer.add(entry)
+            if group:
+                await self.dispatch(group)
+
+    # --- Scanning ---
+
+    async def scan_group(self, files):
+        # The semaphore slot was taken in dispatch() and is freed once the request is done
+        for file_id, *_ in files:
+            base_id, _, chunk = file_id.partition(".")
+            print(f"📄 Scanning: {self.file_paths[base_id]}" + (f" (chunk {chunk})" if chunk else ""))
+        try:
+            scanned = await scan_with_ai(files, self.level, self.version)
+        except Exception as e:
+            # An unexpected error fails this group only; its files are reported as failed
+            print(f"❌ Error scanning file {file_names(files)}: {e}")
+            scanned = {}
+        finally:
+            self.semaphore.release()
+        self.handle_scanned(files, scanned)
+
+    async def dispatch(self, group):
+        # Batch mode submits everything at the end; live mode starts the request as soon as
+        # a slot is free, so the caller waits instead of queueing unbounded work
+        if self.use_batch:
+            self.groups.append(group)
+            return
+        await self.semaphore.acquire()
+        task = asyncio.create_task(self.scan_group(group))
+        self.scan_tasks.add(task)
+        task.add_done_callback(self.scan_tasks.discard)
+
+    async def read_worker(self, queue):
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            await self.read_file(*item)
+
+    async def run(self):
+        """Walk the directory, read and pack files, and scan every group."""
+        # Paths are handed to reader workers as the directory walk finds them
+        queue = asyncio.Queue(maxsize=self.max_concurrency * 2)
+        workers = [asyncio.create_task(self.read_worker(queue)) for _ in range(self.max_concurrency)]
+        put = queue.put
+        for index, file in enumerate(find_supported_files(self.directory), 1):
+            # Ids follow discovery order and are never reused, even after an unreadable file is dropped
+            file_id = str(index)
+            self.file_paths[file_id] = file
+            await put((file_id, file))
+        for _ in workers:
+            await queue.put(None)
+        await asyncio.gather(*workers)
+
+        for group in self.packer.flush():
+            await self.dispatch(group)
+
+        if self.use_batch:
+            scanned = await scan_with_ai_batch(self.groups, self.level, self.version)
+            for files in self.groups:
+                self.handle_scanned(files, scanned)
+        else:
+            await asyncio.gather(*self.scan_tasks)
+
 # -------------------------
 # Main Runner
 # -------------------------
-def main():
+async def main():
     # --- Compliance / Acknowledgement ---
     if os.getenv("AI_CHECKER_ACKNOWLEDGED") != "true":
         print("⚠️ This tool sends your code snippets to the OpenAI API for processing.")
@@ -374,66 +1277,36 @@ def main():
             print("Exiting. You must acknowledge before running.")
             exit(0)
 
-    level, version, output_format, directory = get_user_inputs()
-    files_to_scan = find_supported_files(directory)
+    level, version, output_format, directory, use_batch, use_cache = get_user_inputs()
 
-    if not files_to_scan:
-        print("⚠️ No supported files found in the specified directory.")
-        return
-
-    print(f"\n🔍 Scanning {len(files_to_scan)} file(s) for WCAG {version} ({level}) issues...\n")
+    print(f"\n🔍 Scanning {directory} for WCAG {version} ({level}) issues...\n")
 
-    # Store all results for PDF generation
-    all_results = []
-
-    for file in files_to_scan:
-        try:
-            with open(file, 'r', encoding='utf-8') as f:
-                content = f.read()
+    session = ScanSession(level, version, output_format, directory, use_batch, use_cache)
+    try:
+        await session.run()
+    finally:
+        session.close()
+        await client_async.close()
 
-            print(f"📄 Scanning: {file}")
-            numbered_content = "\n".join(f"{i+1:4}: {line}" for i, line in enumerate(content.splitlines()))
-            issues = scan_with_ai(numbered_content, os.path.basename(file), level, version)
+    if not session.file_paths:
+        if session.results_path:
+            os.remove(session.results_path)
+        print("⚠️ No supported files found in the specified directory.")
+        return None
 
-            # Store results for PDF
-            all_results.append((file, issues))
+    # Any PDF is built by the caller once the event loop has stopped
+    return session
 
-            if not issues:
-                print("✅ No accessibility issues found.\n")
-                continue
-
-            if output_format == "table":
-                table_data = [
-                    [
-                        i+1,
-                        issue.get("title", ""),
-                        issue.get("issue_type", ""),
-                        issue.get("severity", ""),
-                        ", ".join(map(str, issue.get("line_numbers", []))),
-                        issue.get("description", ""),
-                        issue.get("suggestion", "")
-                    ]
-                    for i, issue in enumerate(issues)
-                ]
-                headers = ["#", "Issue Title", "Issue Type", "Severity", "Line(s)", "Description", "Suggestion"]
-                print(tabulate(table_data, headers=headers, tablefmt="grid", maxcolwidths=[None, 25, 15, 10, 10, 40, 40]))
-                print("\n" + "-"*100 + "\n")
-
-            elif output_format == "list":
-                for idx, issue in enumerate(issues, start=1):
-                    print(f"\n{idx}. {issue.get('title', '')} [{issue.get('issue_type', '')}] (Severity: {issue.get('severity', '')})")
-                    print(f"   Lines: {', '.join(map(str, issue.get('line_numbers', [])))}")
-                    print(f"   Description: {issue.get('description', '')}")
-                    print(f"   Suggestion: {issue.get('suggestion', '')}")
-                    print("-"*80)
+if __name__ == "__main__":
+    session = asyncio.run(main())
 
-        except Exception as e:
-            print(f"❗ Could not read {file}: {str(e)}")
-    
-    # Generate PDF if requested
-    if output_format == "pdf":
-        pdf_file = export_to_pdf(all_results, level, version, directory)
+    # Generate PDF if requested; done outside the event loop so its worker processes
+    # are forked from a single-threaded process
+    if session and session.results_path:
+        pdf_file = export_to_pdf(session.results_path, session.level, session.version, session.directory)
         print(f"\n✅ PDF report generated: {pdf_file}")
+        print(f"🗂️ Raw results saved to: {session.results_path}")
 
-if __name__ == "__main__":
-    main()
+    if session and session.failed:
+        print(f"\n❌ {session.failed} file(s) could not be scanned. Re-run to retry them.")
+        exit(1)